@@ -1,50 +1,153 @@
+import argparse
 import json
 import time
 import random
 import os
 import re
+import sys
 from datetime import datetime, timedelta
-import requests
-from selenium import webdriver
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver import ActionChains
-from anticaptchaofficial.imagecaptcha import imagecaptcha
-import telegram
-from telegram.ext import Updater, MessageHandler, Filters
-from selenium.common.exceptions import (
-    TimeoutException,
-    NoSuchElementException,
-    WebDriverException,
-    ElementClickInterceptedException,
-)
+import io
+import queue
+import threading
+
+# Selenium and undetected_chromedriver are imported on first browser use (see import_browser_modules)
+webdriver = uc = By = WebDriverWait = EC = ActionChains = None
+TimeoutException = NoSuchElementException = WebDriverException = ElementClickInterceptedException = None
+
+def import_browser_modules():
+    """Imports the browser automation stack into module globals. Slow, so only done when a browser is needed."""
+    global webdriver, uc, By, WebDriverWait, EC, ActionChains
+    global TimeoutException, NoSuchElementException, WebDriverException, ElementClickInterceptedException
+    if uc is not None: return
+    from selenium import webdriver
+    import undetected_chromedriver as uc
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver import ActionChains
+    from selenium.common.exceptions import (
+        TimeoutException,
+        NoSuchElementException,
+        WebDriverException,
+        ElementClickInterceptedException,
+    )
+
+class LazyValue:
+    """Proxy that builds the wrapped object with factory() on first use."""
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+
+    def _resolve(self):
+        if not self._loaded:
+            self._value = self._factory()
+            self._loaded = True
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def __contains__(self, item):
+        return item in self._resolve()
 
 # --- Configuration Loading ---
-try:
-    with open("config.json", "r", encoding="utf-8") as f:
-        CONFIG = json.load(f)
-except FileNotFoundError:
-    print("ERROR: config.json not found. Please create it.")
-    exit()
-except json.JSONDecodeError:
-    print("ERROR: config.json is not valid JSON.")
-    exit()
+def load_config():
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print("ERROR: config.json not found. Please create it.")
+        exit()
+    except json.JSONDecodeError:
+        print("ERROR: config.json is not valid JSON.")
+        exit()
+
+CONFIG = LazyValue(load_config)
 # --- End Configuration Loading ---
 
 # --- Load Search Queries ---
 SEARCH_QUERIES_FILE = "search_queries.txt"
-try:
-    with open(SEARCH_QUERIES_FILE, "r", encoding="utf-8") as f:
-        # Read lines, strip whitespace, filter out empty lines
-        SEARCH_QUERIES = [line.strip() for line in f if line.strip()]
-    if not SEARCH_QUERIES:
-        print(f"ERROR: {SEARCH_QUERIES_FILE} is empty or contains no valid queries.")
+
+def load_search_queries():
+    try:
+        with open(SEARCH_QUERIES_FILE, "r", encoding="utf-8") as f:
+            # Read lines, strip whitespace, filter out empty lines
+            search_queries = [line.strip() for line in f if line.strip()]
+        if not search_queries:
+            print(f"ERROR: {SEARCH_QUERIES_FILE} is empty or contains no valid queries.")
+            exit()
+        return search_queries
+    except FileNotFoundError:
+        print(f"ERROR: {SEARCH_QUERIES_FILE} not found. Please create it with one search query per line.")
+        exit()
+
+def parse_subscriber(query, subscriber):
+    """Validates one SUBSCRIPTIONS entry. Returns the normalised subscriber, or an error message."""
+    if isinstance(subscriber, (str, int)) and not isinstance(subscriber, bool):
+        subscriber = {"chat_id": subscriber}
+    if not isinstance(subscriber, dict):
+        return f"subscriber {subscriber!r} for '{query}' must be a chat ID or an object"
+    subscriber = dict(subscriber)
+    chat_id = subscriber.get("chat_id") or CONFIG["TELEGRAM_CHAT_ID"]
+    if not isinstance(chat_id, (str, int)) or isinstance(chat_id, bool):
+        return f"chat_id {chat_id!r} for '{query}' must be a string or number"
+    subscriber["chat_id"] = str(chat_id)
+    for key in ("min_price", "max_price"):
+        if key not in subscriber: continue
+        try:
+            if isinstance(subscriber[key], bool): raise ValueError
+            subscriber[key] = float(subscriber[key])
+        except (TypeError, ValueError):
+            return f"{key} {subscriber[key]!r} for '{query}' must be a number"
+    for key in ("include", "exclude"):
+        keywords = subscriber.get(key, [])
+        if not isinstance(keywords, list) or not all(isinstance(keyword, str) for keyword in keywords):
+            return f"{key} for '{query}' must be a list of strings, e.g. [\"keyword\"]"
+    return subscriber
+
+def load_subscriptions():
+    """Maps every distinct search query to its subscriber chats.
+
+    Uses config SUBSCRIPTIONS ({"query": [chat_id or {"chat_id": ..., filters...}]}) when
+    present, otherwise sends every query in search_queries.txt to TELEGRAM_CHAT_ID.
+    """
+    configured = CONFIG.get("SUBSCRIPTIONS")
+    if not configured:
+        return {query: [{"chat_id": str(CONFIG["TELEGRAM_CHAT_ID"])}] for query in load_search_queries()}
+    if not isinstance(configured, dict):
+        print("ERROR: SUBSCRIPTIONS in config.json must map each query to a list of subscribers.")
+        exit()
+    subscriptions = {}
+    for query, subscribers in configured.items():
+        query = " ".join(query.split())
+        if not query: continue
+        if not isinstance(subscribers, list):
+            print(f"ERROR: SUBSCRIPTIONS in config.json: subscribers for '{query}' must be a list, e.g. [\"123456789\"].")
+            exit()
+        for subscriber in subscribers:
+            subscriber = parse_subscriber(query, subscriber)
+            if isinstance(subscriber, str):
+                print(f"ERROR: SUBSCRIPTIONS in config.json: {subscriber}.")
+                exit()
+            subscriptions.setdefault(query, []).append(subscriber)
+    if not subscriptions:
+        print("ERROR: SUBSCRIPTIONS in config.json contains no valid queries.")
         exit()
-except FileNotFoundError:
-    print(f"ERROR: {SEARCH_QUERIES_FILE} not found. Please create it with one search query per line.")
-    exit()
+    return subscriptions
+
+SUBSCRIPTIONS = LazyValue(load_subscriptions)
+# Each distinct query is crawled once, however many chats subscribe to it
+SEARCH_QUERIES = LazyValue(lambda: list(SUBSCRIPTIONS))
 # --- End Load Search Queries ---
 
 
@@ -66,20 +169,22 @@ BLOCK_SCREENSHOT_DIR = os.path.join(SCREENSHOT_DIR, "block_pages")
 PAGE_LOG_DIR = os.path.join(LOG_DIR, "pages")
 ERROR_LOG_DIR = os.path.join(LOG_DIR, "errors")
 
-# Ensure directories exist
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(LOGIN_SCREENSHOT_DIR, exist_ok=True)
-os.makedirs(CAPTCHA_SCREENSHOT_DIR, exist_ok=True)
-os.makedirs(SEARCH_SCREENSHOT_DIR, exist_ok=True)
-os.makedirs(ITEM_SCREENSHOT_DIR, exist_ok=True)
-os.makedirs(ERROR_SCREENSHOT_DIR, exist_ok=True)
-os.makedirs(BLOCK_SCREENSHOT_DIR, exist_ok=True)
-os.makedirs(PAGE_LOG_DIR, exist_ok=True)
-os.makedirs(ERROR_LOG_DIR, exist_ok=True)
+def ensure_directories():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(LOGIN_SCREENSHOT_DIR, exist_ok=True)
+    os.makedirs(CAPTCHA_SCREENSHOT_DIR, exist_ok=True)
+    os.makedirs(SEARCH_SCREENSHOT_DIR, exist_ok=True)
+    os.makedirs(ITEM_SCREENSHOT_DIR, exist_ok=True)
+    os.makedirs(ERROR_SCREENSHOT_DIR, exist_ok=True)
+    os.makedirs(BLOCK_SCREENSHOT_DIR, exist_ok=True)
+    os.makedirs(PAGE_LOG_DIR, exist_ok=True)
+    os.makedirs(ERROR_LOG_DIR, exist_ok=True)
 
 # --- File Paths ---
 COOKIE_FILE = os.path.join(DATA_DIR, "xianyu_cookies.json")
 KNOWN_PRODUCTS_FILE = os.path.join(DATA_DIR, "known_products.json")
+IMAGE_HASH_FILE = os.path.join(DATA_DIR, "image_hashes.json")
+RUN_STATE_FILE = os.path.join(DATA_DIR, "run_state.json")
 # --- End Directory Setup & File Paths ---
 
 # --- Global variables for skip tracking ---
@@ -110,23 +215,111 @@ def log_message(message, level="info", photo_path=None, caption=""):
     print(f"[{level.upper()}] {message or caption}")
 
 # --- Initialize Telegram Bot ---
-try:
-    telegram_bot = telegram.Bot(token=CONFIG["TELEGRAM_TOKEN"])
-except Exception as e:
-    print(f"Error initializing Telegram bot: {e}")
-    class DummyBot:
-        def send_message(self, chat_id, text, **kwargs):
-             log_message(text)
-        def send_photo(self, chat_id, photo, **kwargs):
-             caption = kwargs.get('caption', '')
-             log_message(caption, photo_path="dummy_path")
-    telegram_bot = DummyBot()
+def create_telegram_bot():
+    try:
+        import telegram
+        from telegram.utils.request import Request
+        # Per-chat sender threads share this bot, so it needs more than the default single connection
+        return telegram.Bot(token=CONFIG["TELEGRAM_TOKEN"], request=Request(con_pool_size=8))
+    except Exception as e:
+        print(f"Error initializing Telegram bot: {e}")
+        class DummyBot:
+            def send_message(self, chat_id, text, **kwargs):
+                 log_message(text)
+            def send_photo(self, chat_id, photo, **kwargs):
+                 caption = kwargs.get('caption', '')
+                 log_message(caption, photo_path="dummy_path")
+        return DummyBot()
+
+telegram_bot = LazyValue(create_telegram_bot)
 # --- End Bot Initialization ---
 
 ACTIVE_CAPTCHA_MSG_ID = None
 
+# --- Rate Governor ---
+class RateGovernor:
+    """AIMD pacing shared by every page load.
+
+    Each clean page load raises the allowed rate by a fixed step; block pages,
+    captchas, login prompts and timeouts cut it by a factor. acquire() sleeps
+    until the next page load fits under the current rate, counted from when the
+    browser last went idle (see mark_idle) and never less than min_gap seconds.
+    """
+    PRESSURE_FACTORS = {"block": 0.25, "captcha": 0.5, "login": 0.5, "timeout": 0.8}
+
+    def __init__(self, initial_rate, min_rate, max_rate, increase_step, min_gap=15):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.min_gap = min_gap
+        self.rate = initial_rate  # page loads per minute
+        self.idle_since = 0.0
+        self.clean_streak = 0
+        self.backoff_count = 0
+        self.last_event = None
+
+    def acquire(self):
+        interval = max(self.min_gap, 60.0 / self.rate * random.uniform(0.8, 1.2))
+        wait = self.idle_since + interval - time.time()
+        if wait > 0:
+            print(f"Rate governor: waiting {wait:.1f}s before next page load ({self.rate:.2f} loads/min).")
+            time.sleep(wait)
+        self.idle_since = time.time()
+
+    def mark_idle(self):
+        """Marks the end of the work on the current page, so the next wait starts from now."""
+        self.idle_since = time.time()
+
+    def record(self, event):
+        """Feeds back the outcome of a page load: "ok" or one of PRESSURE_FACTORS."""
+        if event == "ok":
+            self.clean_streak += 1
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+        else:
+            self.clean_streak = 0
+            self.backoff_count += 1
+            self.rate = max(self.min_rate, self.rate * self.PRESSURE_FACTORS.get(event, 0.5))
+            print(f"Rate governor: '{event}' detected, backing off to {self.rate:.2f} loads/min.")
+        self.last_event = event
+
+    def backoff_multiplier(self):
+        """How many times slower than the configured starting rate the governor currently runs."""
+        return max(1.0, self.initial_rate / self.rate)
+
+    def status(self):
+        return {
+            "rate_per_min": round(self.rate, 3),
+            "backoff_multiplier": round(self.backoff_multiplier(), 2),
+            "clean_streak": self.clean_streak,
+            "backoff_count": self.backoff_count,
+            "last_event": self.last_event,
+        }
+
+    def restore(self, status):
+        self.rate = min(self.max_rate, max(self.min_rate, status.get("rate_per_min", self.rate)))
+        self.clean_streak = status.get("clean_streak", 0)
+        self.backoff_count = status.get("backoff_count", 0)
+        self.last_event = status.get("last_event")
+
+rate_governor = LazyValue(lambda: RateGovernor(
+    CONFIG.get("RATE_INITIAL_PER_MIN", 2.5),
+    CONFIG.get("RATE_MIN_PER_MIN", 0.2),
+    CONFIG.get("RATE_MAX_PER_MIN", 4.0),
+    CONFIG.get("RATE_INCREASE_STEP", 0.1),
+    CONFIG.get("RATE_MIN_GAP_SECONDS", 15),
+))
+
+def load_page(driver, url=None):
+    """Loads url, or refreshes the current page, once the rate governor allows it."""
+    rate_governor.acquire()
+    if url: driver.get(url)
+    else: driver.refresh()
+# --- End Rate Governor ---
+
 def get_yuan_to_euro_rate():
     try:
+        import requests
         response = requests.get("https://api.exchangerate-api.com/v4/latest/CNY", timeout=10)
         data = response.json()
         return data["rates"]["EUR"]
@@ -154,6 +347,7 @@ def yuan_to_euro(yuan_str):
         print(f"Error converting currency: {e}")
         return "€N/A"
 def setup_browser():
+    import_browser_modules()
     try:
         options = uc.ChromeOptions()
         options.add_argument(f"user-agent={CONFIG['USER_AGENT']}")
@@ -196,7 +390,7 @@ def setup_browser():
             raise Exception(f"Failed to initialize any browser: {e}, {e2}")
 def load_cookies(driver):
     try:
-        driver.get("https://www.goofish.com/")
+        load_page(driver, "https://www.goofish.com/")
         time.sleep(3)
         if os.path.exists(COOKIE_FILE):
             with open(COOKIE_FILE, "r") as f:
@@ -205,7 +399,7 @@ def load_cookies(driver):
                     if 'expiry' in cookie: del cookie['expiry']
                     try: driver.add_cookie(cookie)
                     except Exception as cookie_error: print(f"Error adding cookie: {cookie_error}")
-            driver.refresh()
+            load_page(driver)
             time.sleep(3)
             return True
     except Exception as e:
@@ -308,6 +502,7 @@ def solve_slider_captcha_with_anticaptcha(driver):
             if elem.is_displayed(): slider_element = elem; break
         if not slider_element: print("Could not find visible slider element for Anti-Captcha."); return False
         slider_element.screenshot(captcha_area_path)
+        from anticaptchaofficial.imagecaptcha import imagecaptcha
         solver = imagecaptcha(); solver.set_verbose(1); solver.set_key(CONFIG["ANTICAPTCHA_KEY"])
         result = solver.solve_and_return_solution(captcha_area_path)
         if not result or "error" in str(result).lower(): print(f"Anti-Captcha failed or returned error: {result}"); return False
@@ -337,6 +532,7 @@ def handle_remote_captcha_solving(driver):
         with open(captcha_remote_path, "rb") as photo:
             msg = telegram_bot.send_photo(chat_id=CONFIG["TELEGRAM_CHAT_ID"], photo=photo, caption="🔴 *CAPTCHA DETECTED!*\n\nPlease solve this slider captcha by telling me how far to slide (e.g., '60%' means slide 60% of the way).\n\nOr type 'remote access' if you need instructions for remote access.")
             ACTIVE_CAPTCHA_MSG_ID = msg.message_id
+        from telegram.ext import Updater, MessageHandler, Filters
         updater = Updater(token=CONFIG["TELEGRAM_TOKEN"]); dispatcher = updater.dispatcher
         def captcha_response_handler(update, context):
             global ACTIVE_CAPTCHA_MSG_ID
@@ -379,6 +575,7 @@ def handle_remote_captcha_solving(driver):
     except Exception as e: telegram_bot.send_message(chat_id=CONFIG["TELEGRAM_CHAT_ID"], text=f"Remote captcha handling error: {str(e)}"); return False
 def handle_captcha(driver):
     if detect_slider_captcha(driver):
+        rate_governor.record("captcha")
         log_message("Captcha detected! Attempting automatic solution...")
         for attempt in range(3):
             if solve_slider_captcha_with_anticaptcha(driver): return True
@@ -386,12 +583,44 @@ def handle_captcha(driver):
         telegram_bot.send_message(chat_id=CONFIG["TELEGRAM_CHAT_ID"], text="Automatic captcha solving failed. Requesting manual help.")
         return handle_remote_captcha_solving(driver)
     return True
-def extract_products(driver, query):
+# Shared by the card walk and the fingerprint script so both derive the same product IDs
+PRODUCT_ID_PATTERN = r'id=(\d+)'
+
+# Ordered product IDs of all result cards, read in a single round trip to the browser.
+# Cards without an ID in their link map to '' (the card walk falls back to hashing their HTML).
+RESULT_FINGERPRINT_SCRIPT = """
+var pattern = new RegExp(arguments[1]);
+return Array.from(document.querySelectorAll(arguments[0])).map(function (card) {
+    var match = pattern.exec(card.href || '');
+    return match ? match[1] : '';
+});
+"""
+
+def fingerprint_usable(ids):
+    """A fingerprint only identifies a result list if it is non-empty and every card has a product ID."""
+    return bool(ids) and all(ids)
+
+def changed_prefix_length(current_ids, previous_ids):
+    """Returns how many leading results are new: the rest of the list is the previous list pushed down."""
+    if not fingerprint_usable(current_ids) or not fingerprint_usable(previous_ids):
+        return len(current_ids)
+    for position in range(len(current_ids)):
+        remaining = current_ids[position:]
+        if remaining == previous_ids[:len(remaining)]:
+            return position
+    return len(current_ids)
+
+def extract_products(driver, query, result_fingerprint=None):
+    """Extracts the result cards for query.
+
+    result_fingerprint holds the ordered product IDs seen on the previous check ("ids") and is
+    updated in place. Returns None without touching the cards if nothing new is at the top of the
+    list, otherwise only the cards in front of the previously seen list are processed. Only the
+    part of the list behind the last card that failed to process is remembered, so failed cards
+    are retried on the next check.
+    """
     products = {}
     try:
-        screenshot_filename = os.path.join(SEARCH_SCREENSHOT_DIR, f"search_{query.replace(' ', '_')}.png")
-        driver.save_screenshot(screenshot_filename)
-        log_message(f"Search results for '{query}' (Sorted by Newest)", photo_path=screenshot_filename)
         item_selector = "a[class*='feeds-item-wrap']"
         try:
             print(f"Waiting for item cards using selector: '{item_selector}'")
@@ -402,10 +631,28 @@ def extract_products(driver, query):
              page_source_path = os.path.join(PAGE_LOG_DIR, f"page_source_no_items_{query.replace(' ', '_')}.html")
              with open(page_source_path, "w", encoding="utf-8") as f: f.write(driver.page_source)
              return {}
+        previous_ids = result_fingerprint.get("ids") if result_fingerprint is not None else None
+        current_ids = driver.execute_script(RESULT_FINGERPRINT_SCRIPT, item_selector, PRODUCT_ID_PATTERN) or []
+        changed_count = changed_prefix_length(current_ids, previous_ids)
+        if not fingerprint_usable(current_ids):
+            print(f"Result list for '{query}' has cards without product IDs. Falling back to full extraction.")
+        elif changed_count == 0:
+            # Identical list, or older items dropped off the end: nothing new at the top
+            result_fingerprint["ids"] = current_ids
+            result_fingerprint["unchanged_checks"] = result_fingerprint.get("unchanged_checks", 0) + 1
+            print(f"Result list for '{query}' unchanged ({len(current_ids)} items). Skipping extraction.")
+            return None
+        screenshot_filename = os.path.join(SEARCH_SCREENSHOT_DIR, f"search_{query.replace(' ', '_')}.png")
+        driver.save_screenshot(screenshot_filename)
+        log_message(f"Search results for '{query}' (Sorted by Newest)", photo_path=screenshot_filename)
         try:
             items = driver.find_elements(By.CSS_SELECTOR, item_selector)
             if not items: raise Exception("Selector found during wait, but find_elements returned empty list.")
-            log_message(f"Found {len(items)} items using selector '{item_selector}'")
+            if fingerprint_usable(current_ids):
+                log_message(f"Found {len(items)} items using selector '{item_selector}', {changed_count} changed since last check")
+                items = items[:changed_count]
+            else:
+                log_message(f"Found {len(items)} items using selector '{item_selector}'")
         except Exception as e:
             log_message(f"Error finding items with selector '{item_selector}': {e}. Saving page source.", level="error")
             page_source_path = os.path.join(PAGE_LOG_DIR, f"page_source_find_items_error_{query.replace(' ', '_')}.html")
@@ -413,10 +660,11 @@ def extract_products(driver, query):
             return {}
         log_message(f"Processing {len(items)} items for query '{query}'...")
         processed_count = 0
-        for item in items:
+        last_failed_position = -1
+        for position, item in enumerate(items):
             try:
                 item_href = item.get_attribute('href')
-                product_id_match = re.search(r'id=(\d+)', item_href) if item_href else None
+                product_id_match = re.search(PRODUCT_ID_PATTERN, item_href) if item_href else None
                 product_id = product_id_match.group(1) if product_id_match else str(hash(item.get_attribute('outerHTML')))
                 title = None
                 try:
@@ -440,7 +688,7 @@ def extract_products(driver, query):
                         if lines:
                             potential_titles = [line for line in lines if len(line) > 5 and '¥' not in line and '￥' not in line]
                             title = potential_titles[0] if potential_titles else lines[0]
-                if not title or len(title) < 3: print(f"Skipping item - no plausible title found. ID: {product_id}"); continue
+                if not title or len(title) < 3: print(f"Skipping item - no plausible title found. ID: {product_id}"); last_failed_position = position; continue
                 price = "Price not found"
                 try:
                     price_element = item.find_element(By.CSS_SELECTOR, "div[class*='price-wrap']")
@@ -478,6 +726,7 @@ def extract_products(driver, query):
                 products[product_id] = {"title": title, "price": price, "price_euro": euro_price, "link": link, "image": item_image, "found_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "screenshot_path": screenshot_path}
                 processed_count += 1
             except Exception as e:
+                last_failed_position = position
                 print(f"Error processing item {product_id}: {str(e)}")
                 try:
                     error_item_path = os.path.join(ERROR_SCREENSHOT_DIR, f"error_item_{product_id}.png")
@@ -485,6 +734,10 @@ def extract_products(driver, query):
                 except: pass
                 continue
         log_message(f"Successfully processed {processed_count} items for query '{query}'.")
+        if result_fingerprint is not None:
+            # Remember only the cards behind the last failure, so failed cards count as changed next time
+            remembered_ids = current_ids[last_failed_position + 1:]
+            result_fingerprint["ids"] = remembered_ids if fingerprint_usable(remembered_ids) else None
     except Exception as e:
         log_message(f"Critical error during product extraction: {str(e)}", level="error")
     return products
@@ -545,18 +798,19 @@ def apply_sort_by_newest(driver):
         return False
 
 # *** UPDATED search_xianyu function with MANDATORY sort ***
-def search_xianyu(driver, query):
+def search_xianyu(driver, query, result_fingerprint=None):
     global skipped_checks_this_hour, total_checks_this_hour, hour_start_time
 
     try:
         search_url = f"https://www.goofish.com/search?q={query}&spm=a21ybx.search.searchInput.0"
-        driver.get(search_url)
+        load_page(driver, search_url)
         time.sleep(random.uniform(4, 8))
 
         # --- Check for block page ---
         block_page_indicators = ["非法访问", "请使用正常浏览器访问"]
         page_source = driver.page_source
         if any(indicator in page_source for indicator in block_page_indicators):
+            rate_governor.record("block")
             block_page_path = os.path.join(BLOCK_SCREENSHOT_DIR, f"block_page_{query.replace(' ', '_')}_{int(time.time())}.png")
             driver.save_screenshot(block_page_path)
             error_msg = f"Block page detected for query '{query}'. Check screenshot: {block_page_path}"
@@ -570,6 +824,7 @@ def search_xianyu(driver, query):
         # --- Check for login prompt BEFORE sorting ---
         total_checks_this_hour += 1
         if login_required(driver):
+            rate_governor.record("login")
             skip_percentage = (skipped_checks_this_hour / total_checks_this_hour * 100) if total_checks_this_hour > 0 else 0
             if total_checks_this_hour >= 5 and skip_percentage > 30:
                 log_message(f"Login required frequently ({skip_percentage:.1f}% skips). Triggering QR code login.", level="warning")
@@ -594,12 +849,18 @@ def search_xianyu(driver, query):
         time.sleep(random.uniform(2, 3))
 
         # Handle potential captchas
+        backoffs_before_captcha = rate_governor.backoff_count
         if not handle_captcha(driver):
             return {}
 
-        return extract_products(driver, query)
+        # Only a page that showed no block page, login prompt or captcha counts as a clean load
+        if rate_governor.backoff_count == backoffs_before_captcha:
+            rate_governor.record("ok")
+
+        return extract_products(driver, query, result_fingerprint)
 
     except TimeoutException:
+        rate_governor.record("timeout")
         log_message(f"Timeout while loading search page for '{query}'. Will retry.", level="warning")
         return {}
     except WebDriverException as e:
@@ -608,39 +869,119 @@ def search_xianyu(driver, query):
     except Exception as e:
         log_message(f"Error during search: {str(e)}", level="error")
         return {}
+    finally:
+        # Sorting, captcha handling and extraction all happen after the page load, so pace from here
+        rate_governor.mark_idle()
 # *** END UPDATED search_xianyu function ***
 
 
+# --- Subscriber Fan-out ---
+class ChatSender:
+    """Delivers queued messages to one chat from its own thread, so a slow or blocked chat never holds up the others."""
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=f"chat-sender-{chat_id}", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, text=None, photo_path=None):
+        self.queue.put((text, photo_path))
+
+    def _run(self):
+        while True:
+            text, photo_path = self.queue.get()
+            try:
+                time.sleep(random.uniform(1, 2))
+                self._deliver(text, photo_path)
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, text, photo_path, attempts=3):
+        for attempt in range(attempts):
+            try:
+                if photo_path:
+                    with open(photo_path, "rb") as photo:
+                        telegram_bot.send_photo(chat_id=self.chat_id, photo=photo, caption=text)
+                else:
+                    telegram_bot.send_message(chat_id=self.chat_id, text=text, disable_web_page_preview=False)
+                return
+            except Exception as e:
+                # telegram.error.RetryAfter carries the flood-control wait
+                wait = getattr(e, "retry_after", None) or 2 ** attempt
+                print(f"Error sending to chat {self.chat_id} (attempt {attempt + 1}/{attempts}): {e}. Retrying in {wait}s.")
+                time.sleep(wait)
+        print(f"Giving up on message for chat {self.chat_id}.")
+
+chat_senders = {}
+
+def get_chat_sender(chat_id):
+    if chat_id not in chat_senders:
+        chat_senders[chat_id] = ChatSender(chat_id)
+    return chat_senders[chat_id]
+
+def flush_chat_senders(timeout=120):
+    """Waits up to timeout seconds for every chat queue to drain."""
+    deadline = time.time() + timeout
+    for sender in list(chat_senders.values()):
+        while sender.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.5)
+
+def parse_price_yuan(price_str):
+    """Returns the first number in a price string (the lower bound of a range), or None."""
+    numeric_match = re.search(r'(\d+\.?\d*)', price_str.replace(",", ""))
+    return float(numeric_match.group(1)) if numeric_match else None
+
+def product_matches_filters(product, subscriber):
+    """Applies a subscriber's optional min_price/max_price (CNY) and include/exclude title keyword filters."""
+    title = product.get("title", "").lower()
+    include = [keyword.lower() for keyword in subscriber.get("include", [])]
+    if include and not any(keyword in title for keyword in include): return False
+    if any(keyword.lower() in title for keyword in subscriber.get("exclude", [])): return False
+    if "min_price" in subscriber or "max_price" in subscriber:
+        price = parse_price_yuan(product.get("price", ""))
+        # Alert anyway when the price could not be read, rather than silently dropping the item
+        if price is not None:
+            if price < subscriber.get("min_price", 0): return False
+            if "max_price" in subscriber and price > subscriber["max_price"]: return False
+    return True
+
 def send_product_alert(product, query, product_id):
-    """Sends only the new product alert - not affected by debug flag."""
+    """Queues the new product alert for every matching subscriber of the query - not affected by debug flag."""
     try:
-        message = f"🆕 New item for '{query}'!\n\n"
+        relist_of = product.get("relist_of")
+        if relist_of:
+            message = f"♻️ Relisted item for '{query}'!\n\n"
+        else:
+            message = f"🆕 New item for '{query}'!\n\n"
         message += f"📌 {product['title']}\n"
         message += f"💰 {product['price']} ({product['price_euro']})\n"
         message += f"🔗 {product['link']}\n"
         message += f"⏰ Found: {product['found_time']}"
-
-        telegram_bot.send_message(
-            chat_id=CONFIG["TELEGRAM_CHAT_ID"],
-            text=message,
-            disable_web_page_preview=False
-        )
+        if relist_of:
+            message += f"\n♻️ Same image as earlier item {relist_of['id']} ('{relist_of['query']}', distance {relist_of['distance']})"
 
         screenshot_path = product.get("screenshot_path")
-        if screenshot_path and os.path.exists(screenshot_path):
-            with open(screenshot_path, "rb") as photo:
-                telegram_bot.send_photo(
-                    chat_id=CONFIG["TELEGRAM_CHAT_ID"],
-                    photo=photo
-                )
-        elif product.get("image"):
-             telegram_bot.send_message(
-                chat_id=CONFIG["TELEGRAM_CHAT_ID"],
-                text=f"Image URL: {product['image']}"
-            )
+        for subscriber in SUBSCRIPTIONS.get(query, []):
+            if not product_matches_filters(product, subscriber): continue
+            sender = get_chat_sender(subscriber["chat_id"])
+            sender.enqueue(text=message)
+            if screenshot_path and os.path.exists(screenshot_path):
+                sender.enqueue(photo_path=screenshot_path)
+            elif product.get("image"):
+                sender.enqueue(text=f"Image URL: {product['image']}")
 
     except Exception as e:
         log_message(f"Error sending product alert: {str(e)}", level="error")
+# --- End Subscriber Fan-out ---
+
+def write_json_atomic(path, data, **dump_kwargs):
+    """Writes JSON to a temp file next to path and renames it over path, so readers never see a partial file."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
 
 def load_known_products():
     if os.path.exists(KNOWN_PRODUCTS_FILE):
@@ -665,26 +1006,216 @@ def save_known_products(known_products):
                   data_copy.pop('screenshot_path', None)
                   products_to_save[query][item_id] = data_copy
 
-        with open(KNOWN_PRODUCTS_FILE, "w", encoding="utf-8") as f:
-            json.dump(products_to_save, f, ensure_ascii=False, indent=2)
+        write_json_atomic(KNOWN_PRODUCTS_FILE, products_to_save, ensure_ascii=False, indent=2)
     except Exception as e:
         print(f"Error saving known products: {e}")
 
-def main():
+# --- Relist Detection (perceptual image hashes) ---
+IMAGE_HASH_BITS = 64
+# Card screenshots include title and price text, so their hashes are never compared with raw image hashes
+IMAGE_HASH_SOURCES = ("image", "screenshot")
+# Blank and placeholder images hash to (nearly) all 0 or all 1 bits and would match each other
+MIN_IMAGE_HASH_SET_BITS = 8
+
+def compute_image_hash(image):
+    """Returns the 64-bit difference hash (dHash) of a PIL image."""
+    from PIL import Image
+    pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    image_hash = 0
+    for row in range(8):
+        for col in range(8):
+            offset = row * 9 + col
+            image_hash = (image_hash << 1) | (pixels[offset] > pixels[offset + 1])
+    return image_hash
+
+def image_hash_informative(image_hash):
+    """False for hashes of plain-colour or near-blank images, which say nothing about the item."""
+    set_bits = bin(image_hash).count("1")
+    return MIN_IMAGE_HASH_SET_BITS <= set_bits <= IMAGE_HASH_BITS - MIN_IMAGE_HASH_SET_BITS
+
+def hash_product_image(product):
+    """Hashes the card image URL of a product, falling back to its item screenshot.
+
+    Returns (source, hash) with source from IMAGE_HASH_SOURCES, or None. Inline data: URIs
+    (lazy-load placeholders) and uninformative image hashes count as no image.
+    """
+    import requests
+    from PIL import Image
+    image_url = product.get("image")
+    if image_url and not image_url.startswith("data:"):
+        if image_url.startswith("//"): image_url = "https:" + image_url
+        try:
+            response = requests.get(image_url, headers={"User-Agent": CONFIG["USER_AGENT"]}, timeout=10)
+            response.raise_for_status()
+            with Image.open(io.BytesIO(response.content)) as image:
+                image_hash = compute_image_hash(image)
+            if image_hash_informative(image_hash):
+                return "image", image_hash
+            print(f"Image for {image_url[:80]} is blank or a placeholder. Trying screenshot.")
+        except Exception as e:
+            print(f"Error hashing image URL {image_url[:80]}: {e}")
+    screenshot_path = product.get("screenshot_path")
+    if screenshot_path and os.path.exists(screenshot_path):
+        try:
+            with Image.open(screenshot_path) as image:
+                return "screenshot", compute_image_hash(image)
+        except Exception as e:
+            print(f"Error hashing screenshot {screenshot_path}: {e}")
+    return None
+
+class ImageHashIndex:
+    """Multi-index Hamming search over 64-bit image hashes.
+
+    Every hash is split into max_distance + 1 disjoint bit segments. Any hash
+    within max_distance bits of a query must match it exactly on at least one
+    segment, so lookups only compare against entries sharing a bucket.
+    """
+    def __init__(self, max_distance=4):
+        self.max_distance = max_distance
+        segment_count = max_distance + 1
+        bounds = [IMAGE_HASH_BITS * i // segment_count for i in range(segment_count + 1)]
+        self.segments = [(low, (1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+        self.tables = [{} for _ in self.segments]
+        self.entries = {}
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, image_hash, query, product_id):
+        if image_hash in self.entries: return
+        self.entries[image_hash] = (query, product_id)
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            table.setdefault((image_hash >> shift) & mask, []).append(image_hash)
+        self.dirty = True
+
+    def find(self, image_hash):
+        """Returns (distance, query, product_id) of the closest hash within max_distance, or None."""
+        best_distance, best_hash = None, None
+        checked = set()
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            for candidate in table.get((image_hash >> shift) & mask, ()):
+                if candidate in checked: continue
+                checked.add(candidate)
+                distance = bin(candidate ^ image_hash).count("1")
+                if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                    best_distance, best_hash = distance, candidate
+        if best_hash is None: return None
+        query, product_id = self.entries[best_hash]
+        return best_distance, query, product_id
+
+def load_image_hash_index():
+    """Loads one ImageHashIndex per hash source from IMAGE_HASH_FILE."""
+    indexes = {source: ImageHashIndex(CONFIG.get("RELIST_HASH_THRESHOLD", 4)) for source in IMAGE_HASH_SOURCES}
+    if os.path.exists(IMAGE_HASH_FILE):
+        try:
+            with open(IMAGE_HASH_FILE, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            for source, index in indexes.items():
+                for hex_hash, (query, product_id) in stored.get(source, {}).items():
+                    index.add(int(hex_hash, 16), query, product_id)
+        except Exception as e:
+            print(f"Error loading image hash index: {e}. Starting fresh.")
+    for index in indexes.values():
+        index.dirty = False
+    return indexes
+
+def save_image_hash_index(indexes):
+    if not any(index.dirty for index in indexes.values()): return
+    try:
+        stored = {source: {f"{image_hash:016x}": [query, product_id] for image_hash, (query, product_id) in index.entries.items()}
+                  for source, index in indexes.items()}
+        write_json_atomic(IMAGE_HASH_FILE, stored, ensure_ascii=False)
+        for index in indexes.values():
+            index.dirty = False
+    except Exception as e:
+        print(f"Error saving image hash index: {e}")
+
+def check_relist(indexes, product, query, product_id):
+    """Indexes the product image and returns the earlier listing it matches, if any."""
+    hashed = hash_product_image(product)
+    if hashed is None: return None
+    source, image_hash = hashed
+    if not image_hash_informative(image_hash): return None
+    product["image_hash"] = f"{image_hash:016x}"
+    product["image_hash_source"] = source
+    index = indexes[source]
+    match = index.find(image_hash)
+    index.add(image_hash, query, product_id)
+    if match and match[2] != product_id:
+        distance, original_query, original_id = match
+        return {"id": original_id, "query": original_query, "distance": distance}
+    return None
+# --- End Relist Detection ---
+
+# --- Run State Checkpointing ---
+def load_run_state():
+    """Loads the run checkpoint and restores the hourly skip counters if the hour is still running."""
+    global skipped_checks_this_hour, total_checks_this_hour, hour_start_time
+    run_state = {"baselined_queries": [], "next_query": None, "next_cycle_at": None, "result_fingerprints": {}}
+    if os.path.exists(RUN_STATE_FILE):
+        try:
+            with open(RUN_STATE_FILE, "r", encoding="utf-8") as f:
+                run_state.update(json.load(f))
+        except Exception as e:
+            print(f"Error loading run state: {e}. Starting fresh.")
+    try:
+        saved_hour_start = datetime.fromisoformat(run_state["hour_start_time"]) if run_state.get("hour_start_time") else None
+    except ValueError:
+        saved_hour_start = None
+    if saved_hour_start and datetime.now() < saved_hour_start + timedelta(hours=1):
+        hour_start_time = saved_hour_start
+        skipped_checks_this_hour = run_state.get("skipped_checks_this_hour", 0)
+        total_checks_this_hour = run_state.get("total_checks_this_hour", 0)
+    if run_state.get("rate_governor"):
+        rate_governor.restore(run_state["rate_governor"])
+    return run_state
+
+def resume_position(search_queries, next_query):
+    """Position in search_queries to start the cycle at: next_query if it is still listed, else the start."""
+    return search_queries.index(next_query) if next_query in search_queries else 0
+
+def get_baselined_queries(run_state, known_products):
+    """Queries that need no silent baseline scan."""
+    baselined_queries = set(run_state.get("baselined_queries", []))
+    # Queries with stored products predate the run state file and already have a baseline
+    baselined_queries.update(query for query, items in known_products.items() if items)
+    return baselined_queries
+
+def save_run_state(run_state):
+    try:
+        run_state["skipped_checks_this_hour"] = skipped_checks_this_hour
+        run_state["total_checks_this_hour"] = total_checks_this_hour
+        run_state["hour_start_time"] = hour_start_time.isoformat()
+        run_state["rate_governor"] = dict(rate_governor.status(), updated_at=datetime.now().isoformat())
+        write_json_atomic(RUN_STATE_FILE, run_state, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"Error saving run state: {e}")
+# --- End Run State Checkpointing ---
+
+def main(single_cycle=False):
+    """Runs the monitor. With single_cycle=True, checks every due query once and returns."""
     global skipped_checks_this_hour, total_checks_this_hour, hour_start_time
 
+    ensure_directories()
     telegram_bot.send_message(
         chat_id=CONFIG["TELEGRAM_CHAT_ID"],
         text="🤖 Xianyu product tracker is starting..."
     )
 
     known_products = load_known_products()
+    relist_indexes = load_image_hash_index() if CONFIG.get("RELIST_DETECTION", True) else None
+    relist_action = CONFIG.get("RELIST_ACTION", "flag")
+
+    run_state = load_run_state()
 
     # Use queries loaded from file
     for query in SEARCH_QUERIES:
         if query not in known_products:
             known_products[query] = {}
 
+    baselined_queries = get_baselined_queries(run_state, known_products)
+
     driver = None
     try:
         driver = setup_browser()
@@ -695,7 +1226,11 @@ def main():
         else:
              log_message("Cookies loaded successfully.")
 
-        first_run = True
+        if not single_cycle and run_state["next_query"] is None and run_state["next_cycle_at"]:
+            remaining = run_state["next_cycle_at"] - time.time()
+            if remaining > 0:
+                log_message(f"Resuming: next check is due in {int(remaining)//60} minutes and {int(remaining) % 60} seconds.")
+                time.sleep(remaining)
 
         while True:
             now = datetime.now()
@@ -705,47 +1240,88 @@ def main():
                 skipped_checks_this_hour = 0
                 total_checks_this_hour = 0
 
-            # Use queries loaded from file
-            for query in SEARCH_QUERIES:
+            # Use queries loaded from file, resuming where the last run stopped
+            start_position = resume_position(SEARCH_QUERIES, run_state["next_query"])
+            if start_position:
+                log_message(f"Resuming cycle at query '{SEARCH_QUERIES[start_position]}'.")
+            for position in range(start_position, len(SEARCH_QUERIES)):
+                query = SEARCH_QUERIES[position]
+                baseline_scan = query not in baselined_queries
+                run_state["next_query"] = query
+                save_run_state(run_state)
+
                 log_message(f"Checking for items: '{query}'")
 
-                current_products = search_xianyu(driver, query)
+                result_fingerprint = run_state["result_fingerprints"].setdefault(query, {"ids": None, "unchanged_checks": 0})
+                if baseline_scan:
+                    result_fingerprint["ids"] = None
+                current_products = search_xianyu(driver, query, result_fingerprint)
 
-                if not current_products and not first_run:
+                if current_products is None:
+                    log_message(f"No changes on the results page for '{query}' ({result_fingerprint['unchanged_checks']} unchanged checks so far).")
+                    run_state["next_query"] = SEARCH_QUERIES[position + 1] if position + 1 < len(SEARCH_QUERIES) else None
+                    save_run_state(run_state)
+                    continue
+
+                if not current_products and not baseline_scan:
                      log_message(f"Skipping product comparison for '{query}' due to earlier error or skip.", level="warning")
                      continue
 
-                if first_run:
+                if baseline_scan:
+                    if relist_indexes is not None:
+                        for product_id, product in current_products.items():
+                            if "image_hash" in known_products[query].get(product_id, {}): continue
+                            check_relist(relist_indexes, product, query, product_id)
                     known_products[query].update(current_products)
+                    if current_products:
+                        baselined_queries.add(query)
+                        run_state["baselined_queries"] = sorted(baselined_queries)
                     log_message(f"Initial scan completed for '{query}'. Found {len(current_products)} items.")
                 else:
                     new_products = {id: product for id, product in current_products.items()
                                   if id not in known_products[query]}
 
-                    if new_products:
-                        telegram_bot.send_message(
-                            chat_id=CONFIG["TELEGRAM_CHAT_ID"],
-                            text=f"Found {len(new_products)} new items for '{query}'!"
-                        )
-
+                    if relist_indexes is not None:
                         for product_id, product in new_products.items():
-                            print(f"Waiting 1-2s before sending alert for {product_id}...")
-                            time.sleep(random.uniform(1, 2))
+                            relist_of = check_relist(relist_indexes, product, query, product_id)
+                            if relist_of:
+                                product["relist_of"] = relist_of
+                                print(f"Item {product_id} looks like a relist of {relist_of['id']} (distance {relist_of['distance']}).")
+
+                    alert_products = {id: product for id, product in new_products.items()
+                                      if not (relist_action == "suppress" and product.get("relist_of"))}
+                    for product_id in new_products.keys() - alert_products.keys():
+                        log_message(f"Suppressed relisted item {product_id} for '{query}'.")
+                        known_products[query][product_id] = new_products[product_id]
+
+                    if alert_products:
+                        for subscriber in SUBSCRIPTIONS[query]:
+                            matching = sum(1 for product in alert_products.values() if product_matches_filters(product, subscriber))
+                            if matching:
+                                get_chat_sender(subscriber["chat_id"]).enqueue(text=f"Found {matching} new items for '{query}'!")
+
+                        for product_id, product in alert_products.items():
                             send_product_alert(product, query, product_id)
                             known_products[query][product_id] = product
-                    else:
+                    elif not new_products:
                         log_message(f"No new items found for '{query}'")
 
                 save_known_products(known_products)
+                if relist_indexes is not None:
+                    save_image_hash_index(relist_indexes)
+                run_state["next_query"] = SEARCH_QUERIES[position + 1] if position + 1 < len(SEARCH_QUERIES) else None
+                save_run_state(run_state)
 
-                if len(SEARCH_QUERIES) > 1:
-                    delay = random.uniform(15, 30)
-                    log_message(f"Waiting {int(delay)} seconds before next query...")
-                    time.sleep(delay)
-
-            first_run = False
-
-            check_interval = random.randint(CONFIG["CHECK_INTERVAL_MIN"], CONFIG["CHECK_INTERVAL_MAX"])
+            run_state["next_query"] = None
+            governor_status = rate_governor.status()
+            log_message(f"Rate governor: {governor_status['rate_per_min']} loads/min, backoff x{governor_status['backoff_multiplier']}, {governor_status['backoff_count']} backoffs so far.")
+            check_interval = int(random.randint(CONFIG["CHECK_INTERVAL_MIN"], CONFIG["CHECK_INTERVAL_MAX"]) * rate_governor.backoff_multiplier())
+            run_state["next_cycle_at"] = time.time() + check_interval
+            save_run_state(run_state)
+            if single_cycle:
+                flush_chat_senders()
+                log_message("Single check cycle completed.")
+                break
             log_message(f"Waiting {check_interval//60} minutes and {check_interval % 60} seconds before next check.")
             time.sleep(check_interval)
 
@@ -774,10 +1350,147 @@ def main():
     finally:
         if driver:
             driver.quit()
+        flush_chat_senders()
         telegram_bot.send_message(
             chat_id=CONFIG["TELEGRAM_CHAT_ID"],
             text="Bot has stopped."
         )
 
+# --- Command Line Interface ---
+def export_products(export_format="csv", output=None, query=None):
+    known_products = load_known_products()
+    rows = []
+    for product_query, items in known_products.items():
+        if query and product_query != query: continue
+        for product_id, product in items.items():
+            rows.append({
+                "query": product_query,
+                "id": product_id,
+                "title": product.get("title", ""),
+                "price": product.get("price", ""),
+                "price_euro": product.get("price_euro", ""),
+                "link": product.get("link", ""),
+                "image": product.get("image", ""),
+                "found_time": product.get("found_time", ""),
+                "relist_of": (product.get("relist_of") or {}).get("id", ""),
+            })
+    out = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+    try:
+        if export_format == "json":
+            json.dump(rows, out, ensure_ascii=False, indent=2)
+            out.write("\n")
+        else:
+            import csv
+            writer = csv.DictWriter(out, fieldnames=["query", "id", "title", "price", "price_euro", "link", "image", "found_time", "relist_of"])
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if output: out.close()
+    print(f"Exported {len(rows)} items.", file=sys.stderr)
+
+def load_json_object(path, description):
+    """Reads a JSON object from path for compact, or prints why it cannot be used and returns None."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict): raise ValueError("not a JSON object")
+        return data
+    except Exception as e:
+        print(f"Error loading {description}: {e}. Leaving it unchanged.")
+        return None
+
+def compact_data(keep=500, drop_removed_queries=False):
+    """Keeps the newest items per query in known_products.json and drops all stored state of removed queries."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    active_queries = None
+    if drop_removed_queries:
+        # Without config.json, SUBSCRIPTIONS cannot exist, so search_queries.txt lists every query
+        active_queries = set(SEARCH_QUERIES) if os.path.exists("config.json") else set(load_search_queries())
+
+    def is_removed(query):
+        return active_queries is not None and query not in active_queries
+
+    known_products = load_known_products()
+    before = sum(len(items) for items in known_products.values())
+    compacted = {}
+    for query, items in known_products.items():
+        if is_removed(query): continue
+        newest = sorted(items.items(), key=lambda entry: entry[1].get("found_time", ""), reverse=True)[:keep]
+        compacted[query] = dict(newest)
+    save_known_products(compacted)
+    after = sum(len(items) for items in compacted.values())
+    print(f"Known products: {before} -> {after} items across {len(compacted)} queries.")
+
+    stored = load_json_object(IMAGE_HASH_FILE, "image hash index") if os.path.exists(IMAGE_HASH_FILE) else None
+    if stored is not None:
+        kept = {source: {hex_hash: entry for hex_hash, entry in stored.get(source, {}).items() if not is_removed(entry[0])}
+                for source in IMAGE_HASH_SOURCES}
+        write_json_atomic(IMAGE_HASH_FILE, kept, ensure_ascii=False)
+        print(f"Image hashes: {sum(len(stored.get(source, {})) for source in IMAGE_HASH_SOURCES)} -> {sum(len(entries) for entries in kept.values())}.")
+
+    # A removed query that is added back later must get a fresh baseline scan, not alert on every item
+    run_state = load_json_object(RUN_STATE_FILE, "run state") if drop_removed_queries and os.path.exists(RUN_STATE_FILE) else None
+    if run_state is not None:
+        fingerprints = run_state.get("result_fingerprints", {})
+        removed_queries = {query for query in set(run_state.get("baselined_queries", [])) | set(fingerprints) if is_removed(query)}
+        run_state["baselined_queries"] = [query for query in run_state.get("baselined_queries", []) if not is_removed(query)]
+        for query in removed_queries:
+            fingerprints.pop(query, None)
+        if is_removed(run_state.get("next_query")):
+            run_state["next_query"] = None
+        write_json_atomic(RUN_STATE_FILE, run_state, ensure_ascii=False, indent=2)
+        print(f"Run state: dropped {len(removed_queries)} removed queries.")
+
+def run_benchmarks(item_count=100000):
+    """Times the local data paths (no browser, Telegram or network access)."""
+    import tempfile
+
+    def timed(label, func, operations=1):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) / operations
+        print(f"{label:<40} {elapsed * 1000:10.3f} ms")
+        return result
+
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(IMAGE_HASH_BITS) for _ in range(item_count)]
+    index = ImageHashIndex(4)
+    timed(f"index {item_count} image hashes", lambda: [index.add(image_hash, "bench", str(i)) for i, image_hash in enumerate(hashes)])
+    probes = [image_hash ^ (1 << rng.randrange(IMAGE_HASH_BITS)) for image_hash in hashes[:1000]]
+    timed("relist lookup (near match, per lookup)", lambda: [index.find(probe) for probe in probes], operations=len(probes))
+
+    products = {"bench": {str(i): {"title": f"item {i}", "price": "¥100", "price_euro": "€12.80", "link": f"https://www.goofish.com/item?id={i}", "image": "", "found_time": "2025-01-01 00:00:00"} for i in range(min(item_count, 20000))}}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "known_products.json")
+        timed(f"atomic save of {len(products['bench'])} products", lambda: write_json_atomic(path, products, ensure_ascii=False, indent=2))
+        def load():
+            with open(path, "r", encoding="utf-8") as f: return json.load(f)
+        timed(f"load of {len(products['bench'])} products", load)
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Xianyu/Goofish product monitor with Telegram alerts.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", help="Monitor continuously (default).")
+    subparsers.add_parser("once", help="Run a single check cycle, then exit.")
+    export_parser = subparsers.add_parser("export", help="Export known products as CSV or JSON.")
+    export_parser.add_argument("--format", dest="export_format", choices=["csv", "json"], default="csv")
+    export_parser.add_argument("--output", help="Output file (default: stdout).")
+    export_parser.add_argument("--query", help="Only export items found for this query.")
+    compact_parser = subparsers.add_parser("compact", help="Prune stored products and rewrite the data files.")
+    compact_parser.add_argument("--keep", type=int, default=500, help="Newest items to keep per query (default: 500).")
+    compact_parser.add_argument("--drop-removed-queries", action="store_true", help=f"Also drop queries no longer subscribed to in config.json or {SEARCH_QUERIES_FILE}.")
+    bench_parser = subparsers.add_parser("bench", help="Time local helpers without starting a browser.")
+    bench_parser.add_argument("--items", type=int, default=100000, help="Number of synthetic items (default: 100000).")
+    return parser
+
+def cli(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command in (None, "run"): main()
+    elif args.command == "once": main(single_cycle=True)
+    elif args.command == "export": export_products(args.export_format, args.output, args.query)
+    elif args.command == "compact": compact_data(args.keep, args.drop_removed_queries)
+    elif args.command == "bench": run_benchmarks(args.items)
+# --- End Command Line Interface ---
+
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,503 @@
+import pytest
+
+import monitoring
+
+
+# --- Relist detection ---
+@pytest.mark.parametrize("max_distance", range(0, 8))
+def test_image_hash_index_segments_cover_all_bits_once(max_distance):
+    index = monitoring.ImageHashIndex(max_distance)
+    assert len(index.segments) == max_distance + 1
+    covered = 0
+    for shift, mask in index.segments:
+        assert covered & (mask << shift) == 0
+        covered |= mask << shift
+    assert covered == (1 << monitoring.IMAGE_HASH_BITS) - 1
+
+
+def test_image_hash_index_threshold_zero_matches_exact_hash_only():
+    index = monitoring.ImageHashIndex(0)
+    index.add(0b1011, "q", "1")
+    assert index.find(0b1011) == (0, "q", "1")
+    assert index.find(0b1010) is None
+
+
+def test_image_hash_index_finds_hashes_within_threshold():
+    index = monitoring.ImageHashIndex(4)
+    base = 0x0123456789ABCDEF
+    index.add(base, "q", "1")
+    assert index.find(base ^ 0b1111) == (4, "q", "1")
+    assert index.find(base ^ 0b11111) is None
+    # Flipped bits spread over every segment still match
+    assert index.find(base ^ (1 | 1 << 20 | 1 << 40 | 1 << 63)) == (4, "q", "1")
+
+
+def test_image_hash_index_find_returns_closest_match():
+    index = monitoring.ImageHashIndex(4)
+    base = 0xFFFF0000FFFF0000
+    index.add(base ^ 0b111, "q", "far")
+    index.add(base ^ 0b1, "q", "near")
+    assert index.find(base) == (1, "q", "near")
+
+
+def test_image_hash_index_ignores_duplicate_hashes():
+    index = monitoring.ImageHashIndex(4)
+    index.add(42, "q", "original")
+    index.add(42, "q", "copy")
+    assert len(index) == 1
+    assert index.find(42) == (0, "q", "original")
+
+
+def test_compute_image_hash_is_stable_across_sizes():
+    Image = pytest.importorskip("PIL.Image")
+    gradient = Image.new("L", (90, 80))
+    gradient.putdata([255 - (x * 255 // 89) for _ in range(80) for x in range(90)])
+    # Brightness falls left to right, so every left pixel is brighter than its neighbour
+    assert monitoring.compute_image_hash(gradient) == (1 << 64) - 1
+    resized = gradient.resize((180, 160))
+    assert monitoring.compute_image_hash(resized) == monitoring.compute_image_hash(gradient)
+    assert monitoring.compute_image_hash(Image.new("RGB", (32, 32), "white")) == 0
+
+
+def test_check_relist_keeps_screenshot_and_image_hashes_apart(monkeypatch):
+    indexes = {source: monitoring.ImageHashIndex(4) for source in monitoring.IMAGE_HASH_SOURCES}
+    hashes = iter([("image", 0xABCDEF0123), ("screenshot", 0xABCDEF0123), ("image", 0xABCDEF0122)])
+    monkeypatch.setattr(monitoring, "hash_product_image", lambda product: next(hashes))
+    assert monitoring.check_relist(indexes, {}, "q", "1") is None
+    assert monitoring.check_relist(indexes, {}, "q", "2") is None
+    assert monitoring.check_relist(indexes, {}, "q", "3") == {"id": "1", "query": "q", "distance": 1}
+
+
+@pytest.mark.parametrize("image_hash, informative", [
+    (0, False),
+    ((1 << 64) - 1, False),
+    (0b1111111, False),
+    (0b11111111, True),
+    (0x0123456789ABCDEF, True),
+])
+def test_image_hash_informative(image_hash, informative):
+    assert monitoring.image_hash_informative(image_hash) is informative
+
+
+def test_blank_images_are_not_reported_as_relists(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    indexes = {source: monitoring.ImageHashIndex(4) for source in monitoring.IMAGE_HASH_SOURCES}
+    for product_id, colour in (("1", "white"), ("2", "white"), ("3", "#eeeeee")):
+        screenshot_path = tmp_path / f"item_{product_id}.png"
+        Image.new("RGB", (200, 200), colour).save(screenshot_path)
+        product = {"screenshot_path": str(screenshot_path)}
+        assert monitoring.check_relist(indexes, product, "q", product_id) is None
+        assert "image_hash" not in product
+    assert all(len(index) == 0 for index in indexes.values())
+
+
+def test_hash_product_image_treats_data_uri_as_missing_image(monkeypatch):
+    requests = pytest.importorskip("requests")
+    monkeypatch.setattr(requests, "get", lambda *args, **kwargs: pytest.fail("data: URI was fetched"))
+    assert monitoring.hash_product_image({"image": "data:image/gif;base64,R0lGODlhAQABAAAAACw="}) is None
+
+
+# --- Rate governor ---
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_rate_governor_paces_from_end_of_processing(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(monitoring.time, "time", clock.time)
+    monkeypatch.setattr(monitoring.time, "sleep", clock.sleep)
+    monkeypatch.setattr(monitoring.random, "uniform", lambda low, high: 1.0)
+    governor = monitoring.RateGovernor(2.0, 0.2, 4.0, 0.1, min_gap=15)
+    governor.acquire()
+    clock.now += 40  # sorting and extraction take longer than the interval
+    governor.mark_idle()
+    governor.acquire()
+    assert clock.sleeps == [30.0]
+
+
+def test_rate_governor_never_waits_less_than_min_gap(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(monitoring.time, "time", clock.time)
+    monkeypatch.setattr(monitoring.time, "sleep", clock.sleep)
+    governor = monitoring.RateGovernor(60.0, 0.2, 60.0, 0.1, min_gap=15)
+    governor.mark_idle()
+    governor.acquire()
+    assert clock.sleeps == [15]
+
+
+def test_rate_governor_backs_off_and_recovers():
+    governor = monitoring.RateGovernor(2.0, 0.2, 4.0, 0.5)
+    governor.record("block")
+    assert governor.rate == 0.5
+    assert governor.backoff_multiplier() == 4.0
+    governor.record("ok")
+    assert governor.rate == 1.0
+    assert governor.status()["clean_streak"] == 1
+
+
+# --- Command line ---
+def test_compact_drops_removed_queries_from_all_state(tmp_path, monkeypatch):
+    import json
+    for name, filename in (("KNOWN_PRODUCTS_FILE", "known_products.json"), ("IMAGE_HASH_FILE", "image_hashes.json"), ("RUN_STATE_FILE", "run_state.json")):
+        monkeypatch.setattr(monitoring, name, str(tmp_path / filename))
+    monkeypatch.setattr(monitoring, "DATA_DIR", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.json").write_text("{}")
+    monkeypatch.setattr(monitoring, "SEARCH_QUERIES", ["kept"])
+    (tmp_path / "known_products.json").write_text(json.dumps({"kept": {"1": {"found_time": "b"}, "2": {"found_time": "a"}}, "gone": {"3": {}}}))
+    (tmp_path / "image_hashes.json").write_text(json.dumps({"image": {"01": ["kept", "1"], "02": ["gone", "3"]}, "screenshot": {}}))
+    (tmp_path / "run_state.json").write_text(json.dumps({
+        "baselined_queries": ["gone", "kept", "older"],
+        "result_fingerprints": {"gone": {"ids": ["3"]}, "kept": {"ids": ["1"]}},
+        "next_query": "gone",
+    }))
+
+    monitoring.compact_data(keep=1, drop_removed_queries=True)
+
+    assert json.loads((tmp_path / "known_products.json").read_text()) == {"kept": {"1": {"found_time": "b"}}}
+    assert json.loads((tmp_path / "image_hashes.json").read_text()) == {"image": {"01": ["kept", "1"]}, "screenshot": {}}
+    run_state = json.loads((tmp_path / "run_state.json").read_text())
+    assert run_state["baselined_queries"] == ["kept"]
+    assert list(run_state["result_fingerprints"]) == ["kept"]
+    assert run_state["next_query"] is None
+
+
+def test_compact_reads_search_queries_file_without_config(tmp_path, monkeypatch):
+    import json
+    data_dir = tmp_path / "data"
+    monkeypatch.setattr(monitoring, "DATA_DIR", str(data_dir))
+    monkeypatch.setattr(monitoring, "KNOWN_PRODUCTS_FILE", str(data_dir / "known_products.json"))
+    monkeypatch.setattr(monitoring, "IMAGE_HASH_FILE", str(data_dir / "image_hashes.json"))
+    monkeypatch.setattr(monitoring, "RUN_STATE_FILE", str(data_dir / "run_state.json"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "search_queries.txt").write_text("kept\n")
+    data_dir.mkdir()
+    (data_dir / "known_products.json").write_text(json.dumps({"kept": {"1": {}}, "gone": {"2": {}}}))
+
+    monitoring.compact_data(drop_removed_queries=True)
+
+    assert json.loads((data_dir / "known_products.json").read_text()) == {"kept": {"1": {}}}
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["data", "search_queries.txt"]
+
+
+def test_compact_leaves_corrupt_state_files_alone(tmp_path, monkeypatch, capsys):
+    for name, filename in (("KNOWN_PRODUCTS_FILE", "known_products.json"), ("IMAGE_HASH_FILE", "image_hashes.json"), ("RUN_STATE_FILE", "run_state.json")):
+        monkeypatch.setattr(monitoring, name, str(tmp_path / filename))
+    monkeypatch.setattr(monitoring, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(monitoring, "SEARCH_QUERIES", ["kept"])
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.json").write_text("{}")
+    (tmp_path / "image_hashes.json").write_text("{truncated")
+    (tmp_path / "run_state.json").write_text("[]")
+
+    monitoring.compact_data(drop_removed_queries=True)
+
+    assert (tmp_path / "image_hashes.json").read_text() == "{truncated"
+    assert (tmp_path / "run_state.json").read_text() == "[]"
+    output = capsys.readouterr().out
+    assert "Error loading image hash index" in output
+    assert "Error loading run state" in output
+
+
+# --- Result list fingerprint ---
+@pytest.mark.parametrize("current, previous, expected", [
+    (["3", "2", "1"], ["3", "2", "1"], 0),  # unchanged
+    (["5", "4", "3", "2"], ["3", "2", "1"], 2),  # new items push the old list down
+    (["2", "1"], ["3", "2", "1"], 2),  # top item removed: the list no longer lines up
+    (["3", "2"], ["3", "2", "1"], 0),  # oldest item dropped off the end
+    (["9", "8"], ["3", "2", "1"], 2),  # nothing in common
+    ([], ["3", "2", "1"], 0),
+    (["3", "2", "1"], None, 3),
+    (["3", "2", "1"], [], 3),
+    (["", ""], ["", ""], 2),  # cards without product IDs never count as unchanged
+    (["4", "", "2"], ["", "2", "1"], 3),
+])
+def test_changed_prefix_length(current, previous, expected):
+    assert monitoring.changed_prefix_length(current, previous) == expected
+
+
+class FakeCard:
+    def __init__(self, product_id, fail=False):
+        self.product_id = product_id
+        self.fail = fail
+        self.text = f"Product title {product_id}\n¥100"
+
+    def get_attribute(self, name):
+        if name == "href":
+            return f"https://www.goofish.com/item?id={self.product_id}" if self.product_id else "https://www.goofish.com/item"
+        return f"<a data-card='{id(self)}'>{self.product_id}</a>"
+
+    def find_element(self, by, selector):
+        if self.fail: raise RuntimeError("stale element")
+        if "main-title" in selector or "price-wrap" in selector:
+            return FakeText("¥100" if "price" in selector else f"Product title {self.product_id}")
+        raise FakeNoSuchElement()
+
+    def find_elements(self, by, selector):
+        return []
+
+    def screenshot(self, path):
+        raise RuntimeError("no screenshots in tests")
+
+
+class FakeText:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeNoSuchElement(Exception):
+    pass
+
+
+class FakeDriver:
+    def __init__(self, cards):
+        self.cards = cards
+        self.screenshots = 0
+
+    def execute_script(self, script, *args):
+        if script == monitoring.RESULT_FINGERPRINT_SCRIPT:
+            return [card.product_id for card in self.cards]
+
+    def find_elements(self, by, selector):
+        return list(self.cards)
+
+    def save_screenshot(self, path):
+        self.screenshots += 1
+
+
+class FakeWait:
+    def __init__(self, driver, timeout):
+        pass
+
+    def until(self, condition):
+        return True
+
+
+@pytest.fixture
+def fake_browser(monkeypatch):
+    monkeypatch.setattr(monitoring, "WebDriverWait", FakeWait)
+    monkeypatch.setattr(monitoring, "EC", type("EC", (), {"presence_of_element_located": staticmethod(lambda locator: locator)}))
+    monkeypatch.setattr(monitoring, "By", type("By", (), {"CSS_SELECTOR": "css selector"}))
+    monkeypatch.setattr(monitoring, "TimeoutException", TimeoutError)
+    monkeypatch.setattr(monitoring, "NoSuchElementException", FakeNoSuchElement)
+    monkeypatch.setattr(monitoring, "log_message", lambda *args, **kwargs: None)
+    monkeypatch.setattr(monitoring, "yuan_to_euro", lambda price: "€12.80")
+    monkeypatch.setattr(monitoring.time, "sleep", lambda seconds: None)
+
+
+def test_extract_products_skips_unchanged_list(fake_browser):
+    driver = FakeDriver([FakeCard("3"), FakeCard("2")])
+    fingerprint = {"ids": ["3", "2"], "unchanged_checks": 4}
+    assert monitoring.extract_products(driver, "q", fingerprint) is None
+    assert fingerprint == {"ids": ["3", "2"], "unchanged_checks": 5}
+    assert driver.screenshots == 0
+
+
+def test_extract_products_processes_only_new_prefix(fake_browser):
+    driver = FakeDriver([FakeCard("5"), FakeCard("4"), FakeCard("3"), FakeCard("2")])
+    fingerprint = {"ids": ["3", "2", "1"], "unchanged_checks": 0}
+    assert sorted(monitoring.extract_products(driver, "q", fingerprint)) == ["4", "5"]
+    assert fingerprint["ids"] == ["5", "4", "3", "2"]
+
+
+def test_extract_products_retries_cards_that_failed(fake_browser):
+    driver = FakeDriver([FakeCard("6"), FakeCard("5", fail=True), FakeCard("4"), FakeCard("3")])
+    fingerprint = {"ids": ["3", "2"], "unchanged_checks": 0}
+    assert sorted(monitoring.extract_products(driver, "q", fingerprint)) == ["4", "6"]
+    assert fingerprint["ids"] == ["4", "3"]
+    # The next check sees the failed card as changed again
+    driver.cards[1].fail = False
+    assert sorted(monitoring.extract_products(driver, "q", fingerprint)) == ["5", "6"]
+    assert fingerprint["ids"] == ["6", "5", "4", "3"]
+
+
+def test_extract_products_without_product_ids_does_full_extraction(fake_browser):
+    driver = FakeDriver([FakeCard(""), FakeCard("")])
+    fingerprint = {"ids": ["", ""], "unchanged_checks": 0}
+    assert len(monitoring.extract_products(driver, "q", fingerprint)) == 2
+    assert fingerprint["ids"] is None
+    assert driver.screenshots == 1
+
+
+def test_extract_products_baseline_with_empty_fingerprint_extracts_everything(fake_browser, monkeypatch):
+    driver = FakeDriver([FakeCard("2"), FakeCard("1")])
+    monkeypatch.setattr(driver, "execute_script", lambda script, *args: [])
+    fingerprint = {"ids": None, "unchanged_checks": 0}
+    assert sorted(monitoring.extract_products(driver, "q", fingerprint)) == ["1", "2"]
+    assert fingerprint["ids"] is None
+
+
+# --- Run state ---
+@pytest.fixture
+def run_state_file(tmp_path, monkeypatch):
+    path = tmp_path / "run_state.json"
+    monkeypatch.setattr(monitoring, "RUN_STATE_FILE", str(path))
+    monkeypatch.setattr(monitoring, "skipped_checks_this_hour", 0)
+    monkeypatch.setattr(monitoring, "total_checks_this_hour", 0)
+    monkeypatch.setattr(monitoring, "hour_start_time", monitoring.datetime.now())
+    return path
+
+
+def test_load_run_state_restores_counters_while_hour_is_running(run_state_file):
+    import json
+    hour_start = monitoring.datetime.now() - monitoring.timedelta(minutes=20)
+    run_state_file.write_text(json.dumps({"hour_start_time": hour_start.isoformat(), "skipped_checks_this_hour": 2, "total_checks_this_hour": 7}))
+    monitoring.load_run_state()
+    assert monitoring.hour_start_time == hour_start
+    assert (monitoring.skipped_checks_this_hour, monitoring.total_checks_this_hour) == (2, 7)
+
+
+def test_load_run_state_drops_counters_of_finished_hour(run_state_file):
+    import json
+    hour_start = monitoring.datetime.now() - monitoring.timedelta(minutes=61)
+    run_state_file.write_text(json.dumps({"hour_start_time": hour_start.isoformat(), "skipped_checks_this_hour": 2, "total_checks_this_hour": 7}))
+    monitoring.load_run_state()
+    assert monitoring.hour_start_time != hour_start
+    assert (monitoring.skipped_checks_this_hour, monitoring.total_checks_this_hour) == (0, 0)
+
+
+@pytest.mark.parametrize("content", [None, "{not json", "[1, 2]"])
+def test_load_run_state_starts_fresh_without_usable_file(run_state_file, content):
+    if content is not None:
+        run_state_file.write_text(content)
+    run_state = monitoring.load_run_state()
+    assert run_state == {"baselined_queries": [], "next_query": None, "next_cycle_at": None, "result_fingerprints": {}}
+    assert (monitoring.skipped_checks_this_hour, monitoring.total_checks_this_hour) == (0, 0)
+
+
+@pytest.mark.parametrize("next_query, expected", [("b", 1), ("c", 2), ("removed", 0), (None, 0)])
+def test_resume_position(next_query, expected):
+    assert monitoring.resume_position(["a", "b", "c"], next_query) == expected
+
+
+def test_get_baselined_queries_needs_stored_products_or_run_state_entry():
+    run_state = {"baselined_queries": ["recorded"]}
+    known_products = {"recorded": {}, "legacy": {"1": {}}, "new": {}}
+    assert monitoring.get_baselined_queries(run_state, known_products) == {"recorded", "legacy"}
+    assert monitoring.get_baselined_queries({}, {}) == set()
+
+
+class FakeSearchPage:
+    page_source = "<html>results</html>"
+
+    def get(self, url):
+        pass
+
+
+@pytest.fixture
+def search_page(fake_browser, monkeypatch):
+    governor = monitoring.RateGovernor(2.0, 0.2, 4.0, 0.5)
+    monkeypatch.setattr(monitoring, "rate_governor", governor)
+    monkeypatch.setattr(monitoring, "WebDriverException", RuntimeError)
+    monkeypatch.setattr(monitoring, "total_checks_this_hour", 0)
+    monkeypatch.setattr(monitoring, "login_required", lambda driver: False)
+    monkeypatch.setattr(monitoring, "apply_sort_by_newest", lambda driver: True)
+    monkeypatch.setattr(monitoring, "extract_products", lambda driver, query, fingerprint: {})
+    return governor
+
+
+def test_search_counts_clean_page_as_ok(search_page, monkeypatch):
+    monkeypatch.setattr(monitoring, "handle_captcha", lambda driver: True)
+    monitoring.search_xianyu(FakeSearchPage(), "q")
+    assert search_page.rate == 2.5
+    assert search_page.last_event == "ok"
+
+
+def test_search_does_not_count_captcha_page_as_ok(search_page, monkeypatch):
+    def solved_captcha(driver):
+        monitoring.rate_governor.record("captcha")
+        return True
+    monkeypatch.setattr(monitoring, "handle_captcha", solved_captcha)
+    monitoring.search_xianyu(FakeSearchPage(), "q")
+    assert search_page.rate == 1.0
+    assert search_page.clean_streak == 0
+
+
+# --- Subscriptions ---
+def test_load_subscriptions_normalises_queries_and_subscribers(monkeypatch):
+    monkeypatch.setattr(monitoring, "CONFIG", {"TELEGRAM_CHAT_ID": 1, "SUBSCRIPTIONS": {
+        "  rtx   3080 ": [2, "3", {"chat_id": 4, "max_price": "500", "include": ["FE"]}, {"exclude": ["broken"]}],
+        "   ": [5],
+    }})
+    assert monitoring.load_subscriptions() == {"rtx 3080": [
+        {"chat_id": "2"},
+        {"chat_id": "3"},
+        {"chat_id": "4", "max_price": 500.0, "include": ["FE"]},
+        {"chat_id": "1", "exclude": ["broken"]},
+    ]}
+
+
+def test_load_subscriptions_falls_back_to_search_queries_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(monitoring, "CONFIG", {"TELEGRAM_CHAT_ID": 1})
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "search_queries.txt").write_text("a\n\nb\n")
+    assert monitoring.load_subscriptions() == {"a": [{"chat_id": "1"}], "b": [{"chat_id": "1"}]}
+
+
+@pytest.mark.parametrize("subscriptions", [
+    ["q"],
+    {"q": "12345"},
+    {"q": [[1]]},
+    {"q": [{"chat_id": 1, "max_price": "cheap"}]},
+    {"q": [{"chat_id": 1, "min_price": True}]},
+    {"q": [{"chat_id": 1, "include": "gpu"}]},
+    {"q": [{"chat_id": 1, "exclude": ["ok", 3]}]},
+    {"  ": [1]},
+])
+def test_load_subscriptions_exits_on_invalid_config(monkeypatch, capsys, subscriptions):
+    monkeypatch.setattr(monitoring, "CONFIG", {"TELEGRAM_CHAT_ID": 1, "SUBSCRIPTIONS": subscriptions})
+    with pytest.raises(SystemExit):
+        monitoring.load_subscriptions()
+    assert "ERROR: SUBSCRIPTIONS" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("subscriber, title, price, matches", [
+    ({}, "anything", "¥10", True),
+    ({"include": ["RTX"]}, "Used rtx 3080", "¥10", True),
+    ({"include": ["rtx", "gtx"]}, "Radeon 6800", "¥10", False),
+    ({"exclude": ["Broken"]}, "RTX 3080 broken fan", "¥10", False),
+    ({"min_price": 100.0}, "x", "¥99", False),
+    ({"min_price": 100.0}, "x", "¥1,200", True),
+    ({"max_price": 500.0}, "x", "¥500", True),
+    ({"max_price": 500.0}, "x", "¥500.5", False),
+    ({"max_price": 500.0}, "x", "price on request", True),
+])
+def test_product_matches_filters(subscriber, title, price, matches):
+    assert monitoring.product_matches_filters({"title": title, "price": price}, {"chat_id": "1", **subscriber}) == matches
+
+
+class FakeChatSender:
+    def __init__(self):
+        self.messages = []
+
+    def enqueue(self, text=None, photo_path=None):
+        self.messages.append(text or photo_path)
+
+
+def test_send_product_alert_routes_to_matching_subscribers_only(tmp_path, monkeypatch):
+    senders = {}
+    monkeypatch.setattr(monitoring, "get_chat_sender", lambda chat_id: senders.setdefault(chat_id, FakeChatSender()))
+    monkeypatch.setattr(monitoring, "SUBSCRIPTIONS", {
+        "gpu": [{"chat_id": "1"}, {"chat_id": "2", "max_price": 100.0}, {"chat_id": "3", "include": ["3080"]}],
+        "other": [{"chat_id": "4"}],
+    })
+    screenshot = tmp_path / "card.png"
+    screenshot.write_bytes(b"png")
+    product = {"title": "RTX 3080", "price": "¥800", "price_euro": "€100", "link": "https://example.com/1",
+               "found_time": "now", "screenshot_path": str(screenshot)}
+
+    monitoring.send_product_alert(product, "gpu", "1")
+
+    assert sorted(senders) == ["1", "3"]
+    for sender in senders.values():
+        assert sender.messages[0].startswith("🆕 New item for 'gpu'!")
+        assert sender.messages[1] == str(screenshot)